@@ -1,35 +1,168 @@
+import io
+import os
+import time
+import hashlib
+import tempfile
+from dataclasses import dataclass, field
 import streamlit as st
+import altair as alt
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
 from datetime import datetime
-import seaborn as sns
+from openpyxl import load_workbook
 
-# Load Excel data with validation and cleanup
-def load_loan_data(file_path):
+try:
+    from python_calamine import CalamineError
+except ImportError:  # calamine is optional; pandas raises ImportError for the engine instead
+    CalamineError = ValueError
+
+LOAN_COLUMNS = ['Loan ID', 'Loan Amount ($C)', 'Duration', 'Interest ($C)',
+                'Late Fee & Interest ($C)', 'Total Payment ($C)']
+# Parse-time dtypes so numeric columns arrive as floats without re-casting later
+# Duration is read as float so fractional day counts load; it becomes an integer after parsing
+LOAN_DTYPES = {'Loan ID': 'string', 'Loan Amount ($C)': 'float64', 'Duration': 'float64',
+               'Interest ($C)': 'float64', 'Late Fee & Interest ($C)': 'float64',
+               'Total Payment ($C)': 'float64'}
+MONETARY_COLUMNS = ['Loan Amount ($C)', 'Interest ($C)', 'Late Fee & Interest ($C)', 'Total Payment ($C)']
+# Parsed uploads persisted across server restarts in a private per-user directory; set
+# LOAN_DASHBOARD_CACHE_DIR to move it, or to an empty string to keep uploads off disk
+PARQUET_CACHE_DIR = os.environ.get('LOAN_DASHBOARD_CACHE_DIR',
+                                   os.path.join(os.path.expanduser('~'), '.cache', 'loan_dashboard'))
+PARQUET_CACHE_MAX_FILES = 16
+PARQUET_CACHE_MAX_AGE = 7 * 24 * 60 * 60  # seconds since last use before a file is deleted
+# Bump whenever parse_loan_data / enrich_loan_data change the frame's columns or dtypes
+PARQUET_CACHE_VERSION = 1
+
+# Fallback reader: read_only mode streams cells instead of building the full workbook DOM,
+# and values go straight into one list per target column rather than an object row table
+def read_loan_sheet_openpyxl(file_path):
+    workbook = load_workbook(file_path, read_only=True, data_only=True)
+    try:
+        rows = workbook['Loan Data'].iter_rows(values_only=True)
+        next(rows, None)  # title row; headers live on the second row
+        headers = [str(name).strip() for name in next(rows, ())]
+        missing = [column for column in LOAN_COLUMNS if column not in headers]
+        if missing:
+            raise KeyError(f"{missing} not in 'Loan Data' headers")
+        targets = [(column, headers.index(column)) for column in LOAN_COLUMNS]
+        values = {column: [] for column in LOAN_COLUMNS}
+        for row in rows:
+            cells = [row[index] if index < len(row) else None for _, index in targets]
+            if all(cell is None for cell in cells):
+                continue  # styled but empty rows; pandas' openpyxl engine drops these too
+            for (column, _), cell in zip(targets, cells):
+                values[column].append(cell)
+        return pd.DataFrame({column: pd.array(values[column], dtype=LOAN_DTYPES[column])
+                             for column in LOAN_COLUMNS})
+    finally:
+        workbook.close()
+
+# Parse the loan sheet into a cleaned, typed and enriched DataFrame
+def parse_loan_data(file_bytes):
+    try:
+        # calamine parses the sheet in native code, much faster than openpyxl
+        loan_data = pd.read_excel(io.BytesIO(file_bytes), sheet_name='Loan Data', engine='calamine',
+                                  header=1, usecols=LOAN_COLUMNS, dtype=LOAN_DTYPES)
+    except (ImportError, ValueError, CalamineError):
+        loan_data = read_loan_sheet_openpyxl(io.BytesIO(file_bytes))
+    loan_data = loan_data[LOAN_COLUMNS].copy()
+    # Fill missing amounts once here rather than branching on every selection
+    loan_data[MONETARY_COLUMNS] = loan_data[MONETARY_COLUMNS].fillna(0.0)
+    # Money stays float64 (float32 loses cents from $131,072 up); only durations are downcast
+    # Truncate like the int() the display applies, keeping missing durations as <NA>
+    loan_data['Duration'] = pd.to_numeric(np.trunc(loan_data['Duration']).astype('Int64'), downcast='integer')
+    # Store IDs as int codes over a shared dictionary; unique() and lookups avoid string compares.
+    # Categories keep file order so the selectbox lists (and defaults to) loans as uploaded
+    loan_ids = loan_data['Loan ID']
+    loan_data['Loan ID'] = pd.Categorical(loan_ids, categories=pd.unique(loan_ids.dropna()))
+    loan_data = enrich_loan_data(loan_data)
+    # Index by Loan ID so per-selection lookups are hashed rather than a full column scan
+    return loan_data.set_index('Loan ID', drop=False)
+
+# Parquet reads are far cheaper than xlsx parsing; fall back to a full parse on a miss
+def load_or_parse_loan_data(file_hash, file_bytes):
+    cache_dir = parquet_cache_dir()
+    if cache_dir is None:
+        return parse_loan_data(file_bytes)
+    evict_parquet_cache(cache_dir)
+    cache_path = os.path.join(cache_dir, f'loans_v{PARQUET_CACHE_VERSION}_{file_hash}.parquet')
+    try:
+        loan_data = pd.read_parquet(cache_path)
+        os.utime(cache_path)  # mark as recently used for eviction
+        return loan_data
+    except (OSError, ImportError, ValueError):
+        pass
+    loan_data = parse_loan_data(file_bytes)
+    try:
+        # Write to a private temp file and rename, so concurrent sessions never see a partial file
+        fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        os.close(fd)
+        try:
+            loan_data.to_parquet(temp_path)
+            os.replace(temp_path, cache_path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        evict_parquet_cache(cache_dir)
+    except (OSError, ImportError, ValueError):
+        pass  # the disk cache is best effort; the parsed data is still returned
+    return loan_data
+
+# Only trust a cache directory this process's user owns and nobody else can read or write;
+# otherwise another local user could plant a frame for a known upload hash
+def parquet_cache_dir():
+    if not PARQUET_CACHE_DIR:
+        return None
+    try:
+        os.makedirs(PARQUET_CACHE_DIR, mode=0o700, exist_ok=True)
+        info = os.stat(PARQUET_CACHE_DIR)
+    except OSError:
+        return None
+    if hasattr(os, 'getuid') and (info.st_uid != os.getuid() or info.st_mode & 0o077):
+        return None
+    return PARQUET_CACHE_DIR
+
+def evict_parquet_cache(cache_dir):
+    try:
+        cached = [(entry.path, entry.stat().st_mtime) for entry in os.scandir(cache_dir)
+                  if entry.name.endswith('.parquet')]
+    except OSError:
+        return
+    cached.sort(key=lambda item: item[1], reverse=True)
+    expired_before = time.time() - PARQUET_CACHE_MAX_AGE
+    for rank, (path, last_used) in enumerate(cached):
+        if rank < PARQUET_CACHE_MAX_FILES and last_used >= expired_before:
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+# Load Excel data with validation and cleanup; keyed on the upload's md5 so Streamlit
+# never hashes the raw bytes and any rerun with unchanged content is a cache hit
+@st.cache_data(show_spinner="Parsing workbook…", max_entries=8)
+def load_loan_data(file_hash, _file_bytes):
     try:
-        excel_data = pd.ExcelFile(file_path)
-        loan_data = excel_data.parse('Loan Data')
-        loan_data.columns = loan_data.iloc[0]
-        loan_data = loan_data.drop(0).reset_index(drop=True)
-        loan_data = loan_data.dropna(how='all', axis=1)
-        loan_data.columns = loan_data.columns.str.strip()
-        return loan_data[['Loan ID', 'Loan Amount ($C)', 'Duration', 'Interest ($C)', 
-                          'Late Fee & Interest ($C)', 'Total Payment ($C)']]
+        return load_or_parse_loan_data(file_hash, _file_bytes)
     except Exception as e:
         st.error(f"Error loading data: {e}")
         return None
 
-# Loan Calculator with optimized calculations
+# Loan Calculator with optimized calculations; slots drop the per-instance dict and the
+# total is computed once since both the display and the monthly payment need it
+@dataclass(slots=True, frozen=True)
 class LoanCalculator:
-    def __init__(self, loan_amount, interest, late_fee, duration):
-        self.loan_amount = loan_amount
-        self.interest = interest
-        self.late_fee = late_fee
-        self.duration = duration
+    loan_amount: float
+    interest: float
+    late_fee: float
+    duration: int
+    _total: float = field(init=False, repr=False, compare=False)
+
+    def __post_init__(self):
+        object.__setattr__(self, '_total', self.loan_amount + self.interest + self.late_fee)
 
     def total_repayment(self):
-        return self.loan_amount + self.interest + self.late_fee
+        return self._total
 
     def calculate_apr(self):
         if self.loan_amount == 0 or self.duration == 0:
@@ -38,37 +171,65 @@ class LoanCalculator:
         return (daily_interest * 365 / self.duration) * 100
 
     def calculate_monthly_payment(self):
-        return self.total_repayment() / max((self.duration / 30), 1)
+        return self._total / max((self.duration / 30), 1)
+
+# Vectorized LoanCalculator over every row, computed once alongside the cached DataFrame
+def enrich_loan_data(loan_data):
+    loan_data = loan_data.copy()
+    loan_amount = loan_data['Loan Amount ($C)'].to_numpy(dtype=np.float64)
+    interest = loan_data['Interest ($C)'].to_numpy(dtype=np.float64)
+    late_fee = loan_data['Late Fee & Interest ($C)'].to_numpy(dtype=np.float64)
+    duration = loan_data['Duration'].to_numpy(dtype=np.float64, na_value=np.nan)
 
-# Visualization helpers
-def plot_apr_comparison(apr, loan_id):
+    total_repayment = loan_amount + interest + late_fee
+    with np.errstate(divide='ignore', invalid='ignore'):
+        apr = np.where((loan_amount == 0) | (duration == 0), 0.0,
+                       (interest / loan_amount) * 365 / duration * 100)
+    loan_data['Total Repayment'] = total_repayment
+    loan_data['APR'] = apr
+    loan_data['Monthly Payment'] = total_repayment / np.maximum(duration / 30, 1)
+    return loan_data
+
+# Keyed on the file hash; the leading underscore tells Streamlit not to hash the DataFrame
+@st.cache_data(show_spinner=False)
+def compute_summary(file_hash, _loan_data):
+    # One reduction over the already-float columns instead of a cast + mean per column
+    stats = _loan_data[['Interest ($C)', 'Late Fee & Interest ($C)', 'Total Payment ($C)']].mean()
+    return {
+        'avg_interest': stats['Interest ($C)'],
+        'avg_late_fee': stats['Late Fee & Interest ($C)'],
+        'avg_total_payment': stats['Total Payment ($C)'],
+    }
+
+# Visualization helpers; simple charts go through Streamlit's native (Vega-Lite) charts
+def apr_comparison_data(apr, loan_id):
     # Convert APR to float to ensure compatibility
     apr_values = [float(apr), 30.0, 50.0, 100.0]  # Ensure all elements are floats
     labels = [str(loan_id), "Competitor A", "Competitor B", "Industry Average"]  # Ensure labels are strings
-    
-    fig, ax = plt.subplots()
-    bars = ax.barh(labels, apr_values)
-    
-    # Add axis labels and title
-    ax.set_xlabel('APR (%)')
-    ax.set_title('APR Comparison')
-    
-    # Annotate each bar with its value
-    for bar in bars:
-        ax.text(bar.get_width() + 1, bar.get_y() + bar.get_height() / 2, f'{bar.get_width():.2f}%', va='center')
-    
-    # Render the plot in Streamlit
-    st.pyplot(fig)
-
-def plot_repayment_projection(calculator, duration):
+    return pd.Series(apr_values, index=labels, name='APR (%)')
+
+def apr_comparison_chart(apr, loan_id):
+    apr_data = apr_comparison_data(apr, loan_id).rename_axis('Loan').reset_index()
+    apr_data['Label'] = apr_data['APR (%)'].map('{:.2f}%'.format)
+    # Horizontal bars in the given order, each annotated with its value
+    bars = alt.Chart(apr_data).mark_bar().encode(
+        x=alt.X('APR (%):Q'), y=alt.Y('Loan:N', sort=None, title=None))
+    labels = bars.mark_text(align='left', dx=3).encode(text='Label:N')
+    return (bars + labels).properties(title='APR Comparison')
+
+def repayment_projection_data(monthly_repayment, duration):
     months = np.arange(1, (duration // 30) + 1)
-    monthly_repayment = calculator.calculate_monthly_payment()
-    plt.figure()
-    plt.plot(months, [monthly_repayment] * len(months), marker='o')
-    plt.xlabel('Month')
-    plt.ylabel('Monthly Repayment ($C)')
-    plt.title('Repayment Projection')
-    st.pyplot(plt)
+    return pd.Series(np.full(months.shape, monthly_repayment, dtype=np.float64), index=pd.Index(months, name='Month'),
+                     name='Monthly Repayment ($C)')
+
+# Plain numpy binning (no KDE fit), computed once per upload
+@st.cache_data(show_spinner=False, max_entries=8)
+def loan_distribution_data(file_hash, _loan_data):
+    # Hand numpy the float64 column as a contiguous array so binning works on it without another copy
+    loan_amounts = np.ascontiguousarray(_loan_data['Loan Amount ($C)'].to_numpy(dtype=np.float64, copy=False))
+    counts, edges = np.histogram(loan_amounts, bins='auto')
+    centers = np.round((edges[:-1] + edges[1:]) / 2, 2)
+    return pd.Series(counts, index=pd.Index(centers, name='Loan Amount ($C)'), name='Frequency')
 
 # Streamlit interface
 st.title("Payday Loan Dashboard")
@@ -76,45 +237,52 @@ st.sidebar.title("Loan Calculator")
 
 uploaded_file = st.sidebar.file_uploader("Upload an Excel file", type=["xlsx"])
 if uploaded_file:
-    loan_data = load_loan_data(uploaded_file)
+    file_bytes = uploaded_file.getvalue()
+    file_hash = hashlib.md5(file_bytes).hexdigest()
+    loan_data = load_loan_data(file_hash, file_bytes)
     if loan_data is not None:
-        loan_ids = loan_data['Loan ID'].unique()
+        summary = compute_summary(file_hash, loan_data)
+        st.sidebar.markdown(
+            f"**Average Interest:** \\${summary['avg_interest']:,.2f}\n\n"
+            f"**Average Late Fee & Interest:** \\${summary['avg_late_fee']:,.2f}\n\n"
+            f"**Average Total Payment:** \\${summary['avg_total_payment']:,.2f}"
+        )
+
+        loan_ids = loan_data['Loan ID'].cat.categories.tolist()
         selected_loan_id = st.sidebar.selectbox("Select Loan ID:", loan_ids)
-        selected_loan_data = loan_data[loan_data['Loan ID'] == selected_loan_id].iloc[0]
+        selected_loan_data = loan_data.loc[selected_loan_id]
+        if isinstance(selected_loan_data, pd.DataFrame):  # duplicate IDs; keep the first row
+            selected_loan_data = selected_loan_data.iloc[0]
 
         # Extract and validate loan parameters
         loan_amount = float(selected_loan_data['Loan Amount ($C)'])
         interest = float(selected_loan_data['Interest ($C)'])
-        late_fee = float(selected_loan_data['Late Fee & Interest ($C)']) if pd.notnull(selected_loan_data['Late Fee & Interest ($C)']) else 0.0
+        late_fee = float(selected_loan_data['Late Fee & Interest ($C)'])
         duration = int(selected_loan_data['Duration'])
 
-        calculator = LoanCalculator(loan_amount, interest, late_fee, duration)
-        total_repayment = calculator.total_repayment()
-        apr = calculator.calculate_apr()
-        monthly_payment = calculator.calculate_monthly_payment()
+        total_repayment = float(selected_loan_data['Total Repayment'])
+        apr = float(selected_loan_data['APR'])
+        monthly_payment = float(selected_loan_data['Monthly Payment'])
 
-        # Display results
-        st.write(f"**Loan Amount:** ${loan_amount:,.2f}")
-        st.write(f"**Interest:** ${interest:,.2f}")
-        st.write(f"**Late Fee & Interest:** ${late_fee:,.2f}")
-        st.write(f"**Duration:** {duration} days")
-        st.write(f"**Total Repayment:** ${total_repayment:,.2f}")
-        st.write(f"**Effective APR:** {apr:.2f}%")
-        st.write(f"**Estimated Monthly Payment:** ${monthly_payment:,.2f}")
+        # Display results in a single element rather than one message per line
+        st.markdown(
+            f"**Loan Amount:** \\${loan_amount:,.2f}\n\n"
+            f"**Interest:** \\${interest:,.2f}\n\n"
+            f"**Late Fee & Interest:** \\${late_fee:,.2f}\n\n"
+            f"**Duration:** {duration} days\n\n"
+            f"**Total Repayment:** \\${total_repayment:,.2f}\n\n"
+            f"**Effective APR:** {apr:.2f}%\n\n"
+            f"**Estimated Monthly Payment:** \\${monthly_payment:,.2f}"
+        )
 
         # Visualizations
         st.subheader("APR Comparison")
-        plot_apr_comparison(apr, selected_loan_id)
+        st.altair_chart(apr_comparison_chart(apr, selected_loan_id), use_container_width=True)
 
         st.subheader("Loan Repayment Projection")
-        plot_repayment_projection(calculator, duration)
+        st.line_chart(repayment_projection_data(monthly_payment, duration))
 
         st.subheader("Loan Amount Distribution")
-        plt.figure()
-        sns.histplot(loan_data['Loan Amount ($C)'].astype(float), kde=True)
-        plt.xlabel('Loan Amount ($C)')
-        plt.ylabel('Frequency')
-        plt.title('Loan Amount Distribution')
-        st.pyplot(plt)
+        st.bar_chart(loan_distribution_data(file_hash, loan_data))
 else:
     st.write("Please upload an Excel file to proceed.")